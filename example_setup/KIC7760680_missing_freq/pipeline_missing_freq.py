@@ -1,12 +1,21 @@
 """ Top level script to run the pipeline sequentially, copy this script to the folder where you want to run the analysis.
-Comment specific imports if you don't want to repeat them on repeated runs."""
+Comment specific steps if you don't want to repeat them on repeated runs."""
 
 if __name__ == "__main__":
-    import importlib
     import os
     from pathlib import Path
 
-    from foam.pipeline import pipeline_config
+    from foam.pipeline import (
+        pipe0_extract_grid,
+        pipe1_construct_pattern,
+        pipe2_calculate_likelihood,
+        pipe3_add_constraints,
+        pipe4_AICc,
+        pipe5_best_model_errors,
+        pipe6_corner_plots,
+        pipe7_table_best_models,
+        pipeline_config,
+    )
 
     pipeline_config.config = pipeline_config.PipelineConfig(
         star="KIC7760680",
@@ -27,11 +36,11 @@ if __name__ == "__main__":
 
     # Run the pipeline
     pipeline_config.config.logger.info("step 0: Extracting grid")
-    importlib.import_module("foam.pipeline.pipe0_extract_grid")
+    pipe0_extract_grid.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 0: Done\n")
 
     pipeline_config.config.logger.info("1: Constructing theoretical patterns")
-    importlib.import_module("foam.pipeline.pipe1_construct_pattern")
+    pipe1_construct_pattern.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 1: Done\n")
 
     # Change the current working directory for nested grids
@@ -40,25 +49,25 @@ if __name__ == "__main__":
         os.chdir(pipeline_config.config.nested_grid_dir)
 
     pipeline_config.config.logger.info("2: Calculating likelihoods")
-    importlib.import_module("foam.pipeline.pipe2_calculate_likelihood")
+    pipe2_calculate_likelihood.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 2: Done\n")
 
     pipeline_config.config.logger.info("3: Adding constraints")
-    importlib.import_module("foam.pipeline.pipe3_add_constraints")
+    pipe3_add_constraints.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 3: Done\n")
 
     pipeline_config.config.logger.info("4: Calculating AIC")
-    importlib.import_module("foam.pipeline.pipe4_AICc")
+    pipe4_AICc.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 4: Done\n")
 
     pipeline_config.config.logger.info("5: Calculating best model errors")
-    importlib.import_module("foam.pipeline.pipe5_best_model_errors")
+    pipe5_best_model_errors.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 5: Done\n")
 
     pipeline_config.config.logger.info("6: Backing plots into a corner")
-    importlib.import_module("foam.pipeline.pipe6_corner_plots")
+    pipe6_corner_plots.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 6: Done\n")
 
     pipeline_config.config.logger.info("7: Making table with best models")
-    importlib.import_module("foam.pipeline.pipe7_table_best_models")
+    pipe7_table_best_models.run(pipeline_config.config)
     pipeline_config.config.logger.info("step 7: Done\n")
@@ -2,7 +2,8 @@
 
 import logging
 import sys
-from functools import partial
+from collections import defaultdict, namedtuple
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
@@ -10,6 +11,10 @@ import pandas as pd
 
 logger = logging.getLogger("logger.ac")
 
+# Surface properties along all evolutionary tracks of the isochrone-cloud for one metallicity, stored as contiguous
+# numpy arrays. The tracks of masses[i] are located at [offsets[i]:offsets[i+1]] in the arrays, sorted by age.
+IsoCloud = namedtuple("IsoCloud", ["masses", "offsets", "star_age", "log_Teff", "log_g", "log_L"])
+
 
 ################################################################################
 def surface_constraint(
@@ -40,8 +45,8 @@ def surface_constraint(
         Information on the companion star. Set to None to model single stars,
         or provide this to include binary constraints using isochrone-clouds.
     isocloud_grid_summary: dict
-        Nested dictionary, the keys at its two levels are metallicity and mass.
-        Holds the surface properties of the grid for the isochrone-cloud modelling per combination of metallicity-mass.
+        Dictionary with the metallicity as keys, holding an IsoCloud with the surface properties of the grid
+        for the isochrone-cloud modelling of all masses at that metallicity (see combine_isocloud_tracks).
     surface_grid_file: string
         File with the surface properties and ages of the model-grid.
     free_parameters: list of strings
@@ -51,32 +56,26 @@ def surface_constraint(
     evolution_step: float
         Change in the evolutionary parameter from one step to the next (negative if quantity decreases, e.g. central hydrogen content Xc)
     """
-    obs_dataframe = pd.read_table(observations_file, sep="\s+", header=0, index_col="index")
+    # The surface properties are given on the first line, so there is no need to parse the rest of the file
+    obs_dataframe = pd.read_csv(
+        observations_file,
+        sep=r"\s+",
+        header=0,
+        index_col="index",
+        nrows=1,
+        dtype=defaultdict(lambda: "float64", index="str"),
+        engine="c",
+    )
+    # Keep the surface properties as plain floats instead of in a DataFrame
+    observations = obs_dataframe.iloc[0].to_dict()
     dataframe_theory = pd.read_hdf(merit_values_file)
 
-    if "Teff" in obs_dataframe.columns:
-        dataframe_theory = dataframe_theory[
-            dataframe_theory.logTeff
-            < np.log10(obs_dataframe["Teff"].iloc[0] + nsigma * obs_dataframe["Teff_err"].iloc[0])
-        ]
-        dataframe_theory = dataframe_theory[
-            dataframe_theory.logTeff
-            > np.log10(obs_dataframe["Teff"].iloc[0] - nsigma * obs_dataframe["Teff_err"].iloc[0])
-        ]
-    if "logg" in obs_dataframe.columns:
-        dataframe_theory = dataframe_theory[
-            dataframe_theory.logg < obs_dataframe["logg"].iloc[0] + nsigma * obs_dataframe["logg_err"].iloc[0]
-        ]
-        dataframe_theory = dataframe_theory[
-            dataframe_theory.logg > obs_dataframe["logg"].iloc[0] - nsigma * obs_dataframe["logg_err"].iloc[0]
-        ]
-    if "logL" in obs_dataframe.columns:
-        dataframe_theory = dataframe_theory[
-            dataframe_theory.logL < obs_dataframe["logL"].iloc[0] + nsigma * obs_dataframe["logL_err"].iloc[0]
-        ]
-        dataframe_theory = dataframe_theory[
-            dataframe_theory.logL > obs_dataframe["logL"].iloc[0] - nsigma * obs_dataframe["logL_err"].iloc[0]
-        ]
+    # Combine all n-sigma bounds in a single boolean mask, and only select the models once
+    surface_bounds = _nsigma_bounds(observations, nsigma)
+    mask = np.ones(dataframe_theory.shape[0], dtype=bool)
+    for observable, (lower, upper) in surface_bounds.items():
+        values = dataframe_theory[{"Teff": "logTeff", "logg": "logg", "logL": "logL"}[observable]].to_numpy()
+        mask &= (values < upper) & (values > lower)
 
     if constraint_companion is not None:
         if (isocloud_grid_summary is None) or (surface_grid_file is None):
@@ -85,10 +84,14 @@ def surface_constraint(
             )
             sys.exit()
 
-        surface_grid_dataframe = pd.read_hdf(surface_grid_file)
+        # The surface grid and its age lookup are shared by all merit value files analysed in this process
+        surface_grid_dataframe, age_lookup = _read_surface_grid(
+            surface_grid_file, tuple(free_parameters), evolution_parameter
+        )
 
-        func = partial(
-            enforce_binary_constraints,
+        # Only check the binary constraints for the models within the error box of the surface properties
+        mask[mask] = enforce_binary_constraints(
+            dataframe_theory.loc[mask],
             constraint_companion=constraint_companion,
             isocloud_grid_summary=isocloud_grid_summary,
             nsigma=nsigma,
@@ -96,29 +99,40 @@ def surface_constraint(
             free_parameters=free_parameters,
             evolution_parameter=evolution_parameter,
             evolution_step=evolution_step,
+            age_lookup=age_lookup,
         )
-        indices_to_drop = dataframe_theory.apply(func, axis=1)
-        for index_to_drop in indices_to_drop:
-            # Check if index_to_drop equals itself to filter out NaN values
-            if (index_to_drop is not None) and (index_to_drop == index_to_drop):
-                dataframe_theory.drop(index_to_drop, inplace=True)
+
+    dataframe_theory = dataframe_theory.loc[mask]
 
     output_file = f"{nsigma}sigmaBox_{merit_values_file}"
     Path(output_file).parent.mkdir(parents=True, exist_ok=True)
-    dataframe_theory.to_hdf(path_or_buf=output_file, key="surface_constrained_models", format="table", mode="w")
+    dataframe_theory.to_hdf(
+        path_or_buf=output_file,
+        key="surface_constrained_models",
+        format="fixed",
+        mode="w",
+        complib="blosc:lz4",
+        complevel=1,
+    )
 
 
 ################################################################################
 def get_age(
-    model, df, free_parameters=["Z", "M", "logD", "aov", "fov", "Xc"], evolution_parameter="Xc", evolution_step=-1e-2
+    models,
+    df,
+    free_parameters=["Z", "M", "logD", "aov", "fov", "Xc"],
+    evolution_parameter="Xc",
+    evolution_step=-1e-2,
+    age_lookup=None,
 ):
     """
-    Get the age of the models one step older and younger than the provided model.
+    Get the age of the models one step older and younger than each of the provided models.
+    The ages are looked up in a MultiIndex of the grid parameters, instead of searching the grid for each model separately.
 
     Parameters
     ----------
-    model: pandas series
-        Parameters of the model.
+    models: pandas DataFrame
+        Parameters of the models.
     df: pandas dataFrame
         Dataframe with the model parameters and age (and surface info) of the theoretical models.
     free_parameters: list of strings
@@ -127,39 +141,46 @@ def get_age(
         Name of the parameter that is used to track the evolutionary steps of the model.
     evolution_step: float
         Change in the evolutionary parameter from one step to the next (negative if quantity decreases, e.g. central hydrogen content Xc)
+    age_lookup: tuple of pandas objects
+        Age lookup of the grid as returned by _surface_age_lookup, built from df if not provided.
 
     Returns
     ----------
-    min_age, max_age: tuple of integers
-        Age of the model one step younger and older than the provided model,
+    min_age, max_age: tuple of numpy arrays
+        Age of the models one step younger and older than the provided models,
         these are the minimum and maximum age to accept models in the isochrone-cloud.
+        The ages are NaN if the neighbouring model is not present in the grid.
     """
-
     # copy to prevent deletion in the list outside this function
     params = list(free_parameters)
     params.remove(evolution_parameter)
-    for param in params:
-        df = df.loc[np.isclose(getattr(df, param), getattr(model, param))]
-
-    model_evolution_attr = getattr(model, evolution_parameter)
-    grid_evolution_attr = getattr(df, evolution_parameter)
-
-    if abs(model_evolution_attr - max(grid_evolution_attr)) < abs(0.5 * evolution_step):
-        min_age = 0
-        max_age = int((df.loc[np.isclose(grid_evolution_attr, model_evolution_attr + evolution_step)].age).iloc[0])
-    elif abs(model_evolution_attr - min(grid_evolution_attr)) < abs(0.5 * evolution_step):
-        min_age = int((df.loc[np.isclose(grid_evolution_attr, model_evolution_attr - evolution_step)].age).iloc[0])
-        age = int((df.loc[np.isclose(grid_evolution_attr, model_evolution_attr)].age).iloc[0])
-        max_age = age + age - min_age
-    else:
-        min_age = int((df.loc[np.isclose(grid_evolution_attr, model_evolution_attr - evolution_step)].age).iloc[0])
-        max_age = int((df.loc[np.isclose(grid_evolution_attr, model_evolution_attr + evolution_step)].age).iloc[0])
+
+    if age_lookup is None:
+        age_lookup = _surface_age_lookup(df, free_parameters, evolution_parameter)
+    age_map, track_range = age_lookup
+
+    model_keys = _grid_key(models[params])
+    model_evolution_attr = models[evolution_parameter].to_numpy()
+
+    def lookup_age(evolution_values):
+        keys = model_keys.assign(**{evolution_parameter: _grid_key(evolution_values)})[free_parameters]
+        return np.trunc(age_map.reindex(pd.MultiIndex.from_frame(keys)).to_numpy(dtype=float))
+
+    age_younger = lookup_age(model_evolution_attr - evolution_step)
+    age_older = lookup_age(model_evolution_attr + evolution_step)
+    track_bounds = track_range.reindex(pd.MultiIndex.from_frame(model_keys))
+    half_step = abs(0.5 * evolution_step)
+    first_step = np.abs(_grid_key(model_evolution_attr) - track_bounds["max"].to_numpy()) < _grid_key(half_step)
+    last_step = np.abs(_grid_key(model_evolution_attr) - track_bounds["min"].to_numpy()) < _grid_key(half_step)
+
+    min_age = np.where(first_step, 0, age_younger)
+    max_age = np.where(first_step | ~last_step, age_older, 2 * lookup_age(model_evolution_attr) - age_younger)
     return min_age, max_age
 
 
 ################################################################################
 def enforce_binary_constraints(
-    df_theory_row,
+    dataframe_theory,
     constraint_companion=None,
     isocloud_grid_summary=None,
     nsigma=3,
@@ -167,25 +188,25 @@ def enforce_binary_constraints(
     free_parameters=["Z", "M", "logD", "aov", "fov", "Xc"],
     evolution_parameter="Xc",
     evolution_step=-1e-2,
+    age_lookup=None,
 ):
     """
     Enforce an n-sigma constraint on the models based on
     spectroscopic observations of the binary companion employing isochrone-clouds.
     Assumes the same metallicity 'Z' for both primary and secondary,
     masses 'M' compatible with observed mass ratio 'q', and ages similar within 1 grid step.
+    All models are evaluated at once per metallicity, only looping over the evolutionary tracks of the isochrone-cloud.
 
     Parameters
     ----------
-    df_theory_row: tuple, made of (int, pandas series)
-        tuple returned from pandas.iterrows(), first tuple entry is the row index of the pandas dataFrame
-        second tuple entry is a pandas series, containing a row from the pandas dataFrame.
-        (This row holds model parameters, the merit function value, and surface properties.)
+    dataframe_theory: pandas DataFrame
+        DataFrame with the model parameters, the merit function values, and surface properties of the models.
     constraint_companion: dict
         Information on the companion star, including surface parameters, mass ratio (q), the errors,
         and a boolean indicating whether the primary or secondary star is assumed pulsating and hence being modelled.
     isocloud_grid_summary: dict
-        Nested dictionary, the keys at its two levels are metallicity and mass.
-        Holds the surface properties of the grid for the isochrone-cloud modelling per combination of metallicity-mass.
+        Dictionary with the metallicity as keys, holding an IsoCloud with the surface properties of the grid
+        for the isochrone-cloud modelling of all masses at that metallicity (see combine_isocloud_tracks).
     nsigma: int
         How many sigma you want to make the interval to accept models.
     surface_grid_dataframe: pandas DataFrame
@@ -196,59 +217,235 @@ def enforce_binary_constraints(
         Name of the parameter that is used to track the evolutionary steps of the model.
     evolution_step: float
         Change in the evolutionary parameter from one step to the next (negative if quantity decreases, e.g. central hydrogen content Xc)
+    age_lookup: tuple of pandas objects
+        Age lookup of the surface grid as returned by _surface_age_lookup, built from surface_grid_dataframe if not provided.
 
     Returns
     ----------
-    index: int or None
-        Index of the dataframe that needs to be removed if binary constraints do not allow the model to remain.
-        Returns None if the binary constraints do not discard the model.
+    survives: numpy array of booleans
+        True for the models that are allowed to remain by the binary constraints, False for models that need to be removed.
     """
-    model = df_theory_row
-    min_age, max_age = get_age(
-        model,
+    q = constraint_companion["q"]
+    q_err = constraint_companion["q_err"]
+    # The error box of the companion is the same for all models and tracks
+    companion_bounds = _nsigma_bounds(constraint_companion, nsigma)
+
+    all_min_age, all_max_age = get_age(
+        dataframe_theory,
         surface_grid_dataframe,
         free_parameters=free_parameters,
         evolution_parameter=evolution_parameter,
         evolution_step=evolution_step,
+        age_lookup=age_lookup,
     )
-    q = constraint_companion["q"]
-    q_err = constraint_companion["q_err"]
-    if constraint_companion["primary_pulsates"]:
-        m2_min = round(model.M * (q - q_err), 1)
-        m2_max = round(model.M * (q + q_err), 1)
-    else:
-        m2_min = round(model.M / (q + q_err), 1)
-        m2_max = round(model.M / (q - q_err), 1)
-
-    isocloud_dict = isocloud_grid_summary[f"{model.Z}"]
-    for key_mass, df in zip(isocloud_dict.keys(), isocloud_dict.values()):
-        # Convert from string to float for the comparisons
-        key_mass = float(key_mass)
-        if key_mass < m2_min or key_mass > m2_max:
-            # Only keep models that fall within mass range
-            continue
+    # Models without neighbouring models in the surface grid have no age range to compare with the isochrone-cloud
+    known_age = pd.notna(all_min_age) & pd.notna(all_max_age)
+    if not known_age.all():
+        logger.warning(
+            f"Discarding {np.count_nonzero(~known_age)} models without neighbouring models in the surface grid to determine their age range."
+        )
+
+    survives = np.zeros(dataframe_theory.shape[0], dtype=bool)
+    for Z, rows in dataframe_theory.groupby("Z", sort=False).indices.items():
+        group = dataframe_theory.iloc[rows]
+        min_age = all_min_age[rows]
+        max_age = all_max_age[rows]
+        group_known_age = known_age[rows]
+
+        mass = group["M"].to_numpy()
+        if constraint_companion["primary_pulsates"]:
+            m2_min = _grid_key(np.round(mass * (q - q_err), 1))
+            m2_max = _grid_key(np.round(mass * (q + q_err), 1))
         else:
-            df = df[(df.star_age < max_age) & (df.star_age > min_age)]
+            m2_min = _grid_key(np.round(mass / (q + q_err), 1))
+            m2_max = _grid_key(np.round(mass / (q - q_err), 1))
+
+        group_survives = np.zeros(group.shape[0], dtype=bool)
+        isocloud = isocloud_grid_summary[f"{Z}"]
+        # Check for all provided constraints which parts of the tracks pass through the uncertainty region,
+        # if no surface properties of the companion are provided the full tracks are used
+        cloud_mask = None
+        for observable, (lower, upper) in companion_bounds.items():
+            values = getattr(isocloud, {"Teff": "log_Teff", "logg": "log_g", "logL": "log_L"}[observable])
+            if cloud_mask is None:
+                cloud_mask = (values < upper) & (values > lower)
+            else:
+                cloud_mask &= (values < upper) & (values > lower)
 
-            if df.shape[0] == 0:
+        for key_mass, start, end in zip(_grid_key(isocloud.masses), isocloud.offsets[:-1], isocloud.offsets[1:]):
+            # Only keep models that fall within mass range
+            in_mass_range = (key_mass >= m2_min) & (key_mass <= m2_max) & group_known_age & ~group_survives
+            if not in_mass_range.any():
+                continue
+            track_ages = isocloud.star_age[start:end]
+            if cloud_mask is not None:
+                track_ages = track_ages[cloud_mask[start:end]]
+            if track_ages.shape[0] == 0:
                 continue
 
-            # Check for all provided constraints if the track passes through the uncertainty region
-            if constraint_companion["Teff"] is not None:
-                df = df[
-                    df.log_Teff < np.log10(constraint_companion["Teff"] + nsigma * constraint_companion["Teff_err"])
-                ]
-                df = df[
-                    df.log_Teff > np.log10(constraint_companion["Teff"] - nsigma * constraint_companion["Teff_err"])
-                ]
-            if constraint_companion["logg"] is not None:
-                df = df[df.log_g < constraint_companion["logg"] + nsigma * constraint_companion["logg_err"]]
-                df = df[df.log_g > constraint_companion["logg"] - nsigma * constraint_companion["logg_err"]]
-            if constraint_companion["logL"] is not None:
-                df = df[df.log_L < constraint_companion["logL"] + nsigma * constraint_companion["logL_err"]]
-                df = df[df.log_L > constraint_companion["logL"] - nsigma * constraint_companion["logL_err"]]
-            if df.shape[0] > 0:
-                # If some models fall within the constraints, return None to not remove the model.
-                return None
-
-    return model.name
+            # Keep the models if part of the track within the uncertainty region has an age similar to the model
+            # (only evaluated for the models in the mass range that have not been accepted yet)
+            candidates = np.flatnonzero(in_mass_range)
+            group_survives[candidates] = _ages_in_range(track_ages, min_age[candidates], max_age[candidates])
+
+        survives[rows] = group_survives
+
+    return survives
+
+
+################################################################################
+def combine_isocloud_tracks(tracks):
+    """
+    Combine the evolutionary tracks of the isochrone-cloud for one metallicity into contiguous arrays per quantity.
+
+    Parameters
+    ----------
+    tracks: dict
+        Dictionary with the masses as keys (as strings or floats), holding a pandas DataFrame (or dictionary of arrays)
+        with the 'star_age', 'log_Teff', 'log_g' and 'log_L' values of all evolutionary tracks with that mass.
+
+    Returns
+    ----------
+    isocloud: IsoCloud
+        The masses, the offsets of each mass in the arrays, and the arrays of the surface properties,
+        sorted by age per mass.
+    """
+    masses = np.asarray([float(mass) for mass in tracks.keys()])
+    lengths = [len(track["star_age"]) for track in tracks.values()]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+
+    columns = {}
+    orders = [np.argsort(np.asarray(track["star_age"]), kind="stable") for track in tracks.values()]
+    for column in ["star_age", "log_Teff", "log_g", "log_L"]:
+        columns[column] = np.concatenate(
+            [np.asarray(track[column], dtype=float)[order] for track, order in zip(tracks.values(), orders)]
+        )
+    return IsoCloud(masses=masses, offsets=offsets, **columns)
+
+
+################################################################################
+@lru_cache(maxsize=2)
+def _read_surface_grid(surface_grid_file, free_parameters, evolution_parameter):
+    """
+    Read the surface grid and build its age lookup, cached since every merit value file analysed by a process
+    is compared to the same surface grid.
+
+    Parameters
+    ----------
+    surface_grid_file: string
+        Path to the hdf5 file with the surface properties and ages of the model-grid.
+    free_parameters: tuple of strings
+        All the parameters varied in the model grid.
+    evolution_parameter: string
+        Name of the parameter that is used to track the evolutionary steps of the model.
+
+    Returns
+    ----------
+    surface_grid_dataframe, age_lookup: tuple
+        DataFrame with the surface properties and ages of the model-grid, and its age lookup (see _surface_age_lookup).
+    """
+    surface_grid_dataframe = pd.read_hdf(surface_grid_file)
+    return surface_grid_dataframe, _surface_age_lookup(
+        surface_grid_dataframe, list(free_parameters), evolution_parameter
+    )
+
+
+################################################################################
+def _surface_age_lookup(df, free_parameters, evolution_parameter):
+    """
+    Index the ages of the grid by the integer keys of the grid parameters.
+
+    Parameters
+    ----------
+    df: pandas dataFrame
+        Dataframe with the model parameters and age (and surface info) of the theoretical models.
+    free_parameters: list of strings
+        List of all the parameters varied in the model grid.
+    evolution_parameter: string
+        Name of the parameter that is used to track the evolutionary steps of the model.
+
+    Returns
+    ----------
+    age_map, track_range: tuple of pandas objects
+        Series with the age of each model indexed by its parameters,
+        and DataFrame with the minimum and maximum of the evolutionary parameter along each track.
+    """
+    params = [parameter for parameter in free_parameters if parameter != evolution_parameter]
+
+    # Convert the parameters to integer keys to compare them exactly
+    grid_keys = _grid_key(df[free_parameters])
+    age_map = pd.Series(df["age"].to_numpy(), index=pd.MultiIndex.from_frame(grid_keys))
+    age_map = age_map[~age_map.index.duplicated()]
+    # Range of the evolutionary parameter along each track
+    track_range = grid_keys.groupby(params)[evolution_parameter].agg(["min", "max"])
+    return age_map, track_range
+
+
+################################################################################
+def _ages_in_range(sorted_ages, min_age, max_age):
+    """
+    Check for each age range if any of the ages lies within that range (boundaries excluded).
+
+    Parameters
+    ----------
+    sorted_ages: numpy array
+        Ages along (part of) a track of the isochrone-cloud, sorted in increasing order.
+    min_age, max_age: numpy arrays
+        Minimum and maximum age of each range.
+
+    Returns
+    ----------
+    in_range: numpy array of booleans
+        True for the ranges that contain at least one of the ages.
+    """
+    # Number of ages below max_age is larger than the number of ages up to min_age if there is an age in between
+    return np.searchsorted(sorted_ages, max_age, side="left") > np.searchsorted(sorted_ages, min_age, side="right")
+
+
+################################################################################
+def _nsigma_bounds(observations, nsigma):
+    """
+    Get the lower and upper bounds of the n-sigma error box on the provided surface observables.
+
+    Parameters
+    ----------
+    observations: dict
+        Values of the observed surface properties 'Teff', 'logg' and/or 'logL', and their errors with the "_err" suffix.
+        Observables that are absent or set to None are not constrained.
+    nsigma: int
+        How many sigma you want to make the interval to accept models.
+
+    Returns
+    ----------
+    bounds: dict
+        Lower and upper bound per provided observable, in logarithmic scale for 'Teff'.
+    """
+    bounds = {}
+    for observable in ["Teff", "logg", "logL"]:
+        if (observable not in observations) or (observations[observable] is None):
+            continue
+        lower = observations[observable] - nsigma * observations[f"{observable}_err"]
+        upper = observations[observable] + nsigma * observations[f"{observable}_err"]
+        if observable == "Teff":
+            lower, upper = np.log10(lower), np.log10(upper)
+        bounds[observable] = (lower, upper)
+    return bounds
+
+
+################################################################################
+def _grid_key(values):
+    """
+    Convert (arrays or DataFrames of) grid parameter values to integer keys,
+    so they can be compared exactly and hashed instead of comparing floats within a tolerance.
+
+    Parameters
+    ----------
+    values: float, numpy array or pandas DataFrame
+        Values of the grid parameters.
+
+    Returns
+    ----------
+    keys: int, numpy array or pandas DataFrame
+        The values in units of 1e-6, rounded to the nearest integer.
+    """
+    return np.rint(values * 1e6).astype(np.int64)
@@ -1,27 +1,37 @@
 """ Top level script to run the pipeline sequentially, copy this script to the folder where you want to run the analysis.
-Comment specific imports if you don't want to repeat them on repeated runs."""
+Comment specific steps if you don't want to repeat them on repeated runs."""
 
 if __name__ == "__main__":
-    import importlib
     import os
     from pathlib import Path
 
-    from foam.pipeline import pipeline_config
+    from foam.pipeline import (
+        pipe0_extract_grid,
+        pipe1_construct_pattern,
+        pipe2_calculate_likelihood,
+        pipe3_add_constraints,
+        pipe4_AICc,
+        pipe5_best_model_errors,
+        pipe6_corner_plots,
+        pipe7_table_best_models,
+        pipeline_config,
+    )
 
     pipeline_config.config = pipeline_config.PipelineConfig()
+    config = pipeline_config.config
 
     # Run the pipeline
-    importlib.import_module("foam.pipeline.pipe0_extract_grid")
-    importlib.import_module("foam.pipeline.pipe1_construct_pattern")
+    pipe0_extract_grid.run(config)
+    pipe1_construct_pattern.run(config)
 
     # Change the current working directory for nested grids
-    if pipeline_config.config.fixed_parameters is not None:
-        Path(pipeline_config.config.nested_grid_dir).mkdir(parents=True, exist_ok=True)
-        os.chdir(pipeline_config.config.nested_grid_dir)
+    if config.fixed_parameters is not None:
+        Path(config.nested_grid_dir).mkdir(parents=True, exist_ok=True)
+        os.chdir(config.nested_grid_dir)
 
-    importlib.import_module("foam.pipeline.pipe2_calculate_likelihood")
-    importlib.import_module("foam.pipeline.pipe3_add_constraints")
-    importlib.import_module("foam.pipeline.pipe4_AICc")
-    importlib.import_module("foam.pipeline.pipe5_best_model_errors")
-    importlib.import_module("foam.pipeline.pipe6_corner_plots")
-    importlib.import_module("foam.pipeline.pipe7_table_best_models")
+    pipe2_calculate_likelihood.run(config)
+    pipe3_add_constraints.run(config)
+    pipe4_AICc.run(config)
+    pipe5_best_model_errors.run(config)
+    pipe6_corner_plots.run(config)
+    pipe7_table_best_models.run(config)
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from foam import additional_constraints as ac
+
+def make_surface_grid():
+    """ Surface grid with two evolutionary tracks of 5 steps in Xc, age increases by 10 per step."""
+    rows = []
+    for M in [2.0, 3.0]:
+        for i, Xc in enumerate([0.70, 0.69, 0.68, 0.67, 0.66]):
+            rows.append({'Z':0.014, 'M':M, 'logD':1.0, 'aov':0.0, 'fov':0.01, 'Xc':Xc, 'age':10*(i+1)})
+    return pd.DataFrame(rows)
+
+def make_isocloud():
+    """ Isocloud with a companion track of 1.0 Msun, only passing the (Teff, logg) uncertainty region at age 35."""
+    track = pd.DataFrame({'star_age': [15.0, 25.0, 35.0, 45.0],
+                          'log_Teff': [3.8, 3.8, 4.0, 3.8],
+                          'log_g'   : [4.0, 4.0, 4.0, 4.0],
+                          'log_L'   : [1.0, 1.0, 1.0, 1.0]})
+    return {'0.014': ac.combine_isocloud_tracks({'1.0': track})}
+
+def test_get_age():
+    """ Test the age range of models at the start, middle and end of an evolutionary track."""
+    surface_grid = make_surface_grid()
+    models = surface_grid.drop(columns='age').iloc[[0, 2, 4]]
+    min_age, max_age = ac.get_age(models, surface_grid)
+    assert list(min_age) == [0, 20, 40]
+    assert list(max_age) == [20, 40, 60]
+
+def test_combine_isocloud_tracks():
+    """ Test that the tracks of all masses are combined into contiguous arrays sorted by age per mass."""
+    tracks = {'1.0': {'star_age': [20.0, 10.0], 'log_Teff': [4.1, 4.0], 'log_g': [4.0, 4.0], 'log_L': [1.0, 1.0]},
+              '1.5': {'star_age': [5.0], 'log_Teff': [4.2], 'log_g': [4.1], 'log_L': [1.5]}}
+    result = ac.combine_isocloud_tracks(tracks)
+    assert list(result.masses) == [1.0, 1.5]
+    assert list(result.offsets) == [0, 2, 3]
+    assert list(result.star_age) == [10.0, 20.0, 5.0]
+    assert list(result.log_Teff) == [4.0, 4.1, 4.2]
+
+def test_enforce_binary_constraints():
+    """ Test that only the models with a companion of compatible mass and age are kept."""
+    surface_grid = make_surface_grid()
+    models = surface_grid.drop(columns='age').iloc[[1, 2, 3, 8]]
+    models.index = [10, 11, 12, 13]
+    companion = {'q': 0.5, 'q_err': 0.01, 'Teff': 10**4, 'Teff_err': 100, 'logg': 4.0, 'logg_err': 0.1,
+                 'logL': None, 'logL_err': None, 'primary_pulsates': True}
+
+    result = ac.enforce_binary_constraints(models, constraint_companion=companion, isocloud_grid_summary=make_isocloud(),
+                                           nsigma=3, surface_grid_dataframe=surface_grid)
+    # Models with age window (20,40) and (30,50) are kept, (10,30) is too young and M=3 has no companion of 1.5 Msun
+    expected = [False, True, True, False]
+    assert list(result) == expected
+
+def test_enforce_binary_constraints_missing_age():
+    """ Test that models without a neighbouring model in the surface grid are discarded."""
+    surface_grid = make_surface_grid()
+    models = surface_grid.drop(columns='age').iloc[[2]]
+    # Remove the older neighbour (Xc=0.67) of the model, which would otherwise be kept
+    surface_grid = surface_grid.drop(index=3)
+    companion = {'q': 0.5, 'q_err': 0.01, 'Teff': 10**4, 'Teff_err': 100, 'logg': None, 'logg_err': None,
+                 'logL': None, 'logL_err': None, 'primary_pulsates': True}
+
+    result = ac.enforce_binary_constraints(models, constraint_companion=companion, isocloud_grid_summary=make_isocloud(),
+                                           nsigma=3, surface_grid_dataframe=surface_grid)
+    expected = [False]
+    assert list(result) == expected